@@ -3,8 +3,12 @@
 # Why: Derive branded tokens from a single brand identifier.
 from __future__ import annotations
 
+import functools
 import re
-from dataclasses import dataclass
+import string
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType
 
 
 class BrandingError(ValueError):
@@ -16,19 +20,41 @@ _SLUG_RE = re.compile(r"^[a-z0-9][a-z0-9-]*$")
 _LABEL_PREFIX_RE = re.compile(r"^[a-z0-9][a-z0-9.-]*$")
 
 
+class _CharMap(dict):
+    """str.translate table that maps every unlisted code point to a separator."""
+
+    def __init__(self, allowed: str, separator: str) -> None:
+        super().__init__((ord(char), char) for char in allowed)
+        self.separator = separator
+
+    def __missing__(self, key: int) -> str:
+        return self.separator
+
+
+_SLUG_CHARS = _CharMap(string.ascii_lowercase + string.digits, "-")
+_ENV_CHARS = _CharMap(string.ascii_uppercase + string.digits, "_")
+
+
 @dataclass(frozen=True)
 class Branding:
     cli_name: str
     slug: str
     env_prefix: str
     label_prefix: str
-    paths: dict[str, str]
-    root_ca: dict[str, str]
-    runtime: dict[str, str]
+    # Read-only views so cached instances cannot be mutated by callers.
+    paths: Mapping[str, str] = field(hash=False)
+    root_ca: Mapping[str, str] = field(hash=False)
+    runtime: Mapping[str, str] = field(hash=False)
 
 
 def derive_branding(brand: str) -> Branding:
-    brand = _require_brand(brand)
+    # Validate before the cache lookup so unhashable input still raises
+    # BrandingError instead of TypeError.
+    return _derive_branding(_require_brand(brand))
+
+
+@functools.lru_cache(maxsize=64)
+def _derive_branding(brand: str) -> Branding:
     slug = _normalize_slug(brand)
     env_prefix = _normalize_env_prefix(brand)
     cli_name = slug
@@ -68,15 +94,20 @@ def derive_branding(brand: str) -> Branding:
         slug=slug,
         env_prefix=env_prefix,
         label_prefix=label_prefix,
-        paths=paths,
-        root_ca=root_ca,
-        runtime=runtime,
+        paths=MappingProxyType(paths),
+        root_ca=MappingProxyType(root_ca),
+        runtime=MappingProxyType(runtime),
     )
 
 
 def build_context(branding: Branding) -> dict[str, str]:
+    return dict(_build_context(branding))
+
+
+@functools.lru_cache(maxsize=64)
+def _build_context(branding: Branding) -> Mapping[str, str]:
     env_prefix_var = "${" + branding.env_prefix
-    return {
+    context = {
         "CLI_NAME": branding.cli_name,
         "SLUG": branding.slug,
         "ENV_PREFIX": branding.env_prefix,
@@ -100,6 +131,7 @@ def build_context(branding: Branding) -> dict[str, str]:
         "RUNTIME_CGROUP_PARENT": branding.runtime["cgroup_parent"],
         "RUNTIME_CGROUP_LEAF": branding.runtime["cgroup_leaf"],
     }
+    return MappingProxyType(context)
 
 
 def _require_brand(value: str) -> str:
@@ -114,14 +146,19 @@ def _validate_pattern(key: str, value: str, pattern: re.Pattern[str]) -> None:
 
 
 def _normalize_slug(value: str) -> str:
-    cleaned = re.sub(r"[^a-z0-9]+", "-", value.strip().lower()).strip("-")
+    cleaned = _collapse(value.strip().lower().translate(_SLUG_CHARS), "-")
     if not cleaned:
         raise BrandingError("brand must include at least one alphanumeric character")
     return cleaned
 
 
 def _normalize_env_prefix(value: str) -> str:
-    cleaned = re.sub(r"[^A-Z0-9]+", "_", value.strip().upper()).strip("_")
+    cleaned = _collapse(value.strip().upper().translate(_ENV_CHARS), "_")
     if not cleaned or not cleaned[0].isalpha():
         raise BrandingError("brand must start with a letter for env_prefix derivation")
     return cleaned
+
+
+def _collapse(value: str, separator: str) -> str:
+    # Squash separator runs and trim them from both ends in one split/join.
+    return separator.join(filter(None, value.split(separator)))
@@ -4,13 +4,14 @@
 from __future__ import annotations
 
 import argparse
-import difflib
+import functools
 import os
 import re
-import subprocess
+import string
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import NamedTuple
+from typing import Callable, NamedTuple
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
@@ -71,6 +72,19 @@ TEMPLATES: tuple[TemplateSpec, ...] = (
 
 _PLACEHOLDER_RE = re.compile(r"{{\s*([A-Z0-9_]+)\s*}}")
 
+_GIT_SHA_RE = re.compile(r"[0-9a-f]{40}(?:[0-9a-f]{24})?")
+
+# One "key: value" line of branding.lock: indent, key, raw value.
+_LOCK_LINE_RE = re.compile(r"^( *)([^#:\s][^:\s]*)\s*:\s*(.*?)\s*$")
+
+# First "brand: value" line of config/branding.yaml.
+_BRAND_LINE_RE = re.compile(r"^[ \t]*brand[ \t]*:(.*)$", re.MULTILINE)
+
+# UTF-8 encoded outputs keyed by (template_path, mtime_ns, size, context, transform).
+_RENDER_CACHE: dict[tuple, bytes] = {}
+# Templates rewritten for str.format_map, keyed by (template_path, mtime_ns, size).
+_FORMAT_CACHE: dict[tuple, str] = {}
+
 
 def main() -> int:
     args = parse_args()
@@ -128,7 +142,11 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Skip tool commit validation (warn instead of error)",
     )
-    parser.add_argument("--verbose", action="store_true", help="Print rendered outputs")
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print rendered outputs (and diffs for --check mismatches)",
+    )
     parser.add_argument(
         "--no-header",
         action="store_true",
@@ -175,18 +193,15 @@ def load_lock_data(path: Path) -> dict[str, str]:
     stack: list[dict[str, str]] = []
     prefixes: list[str] = []
     for line in path.read_text(encoding="utf-8").splitlines():
-        stripped = line.strip()
-        if not stripped or stripped.startswith("#"):
+        match = _LOCK_LINE_RE.match(line)
+        if not match:
             continue
-        indent = len(line) - len(line.lstrip(" "))
+        indent_str, key, raw_value = match.groups()
+        raw_value = _strip_inline_comment(raw_value)
+        indent = len(indent_str)
         while stack and indent < len(stack) * 2:
             stack.pop()
             prefixes.pop()
-        if ":" not in stripped:
-            continue
-        key, raw_value = stripped.split(":", 1)
-        key = key.strip()
-        raw_value = raw_value.strip()
         if not raw_value:
             if stack:
                 prefixes.append(f"{prefixes[-1]}{key}.")
@@ -298,18 +313,20 @@ def has_esb_base(info: dict[str, str]) -> bool:
 
 
 def write_esb_info(path: Path, key: str, value: str) -> None:
-    content = "\n".join(
-        [
-            "# Auto-generated by branding generator. DO NOT EDIT.",
-            "# Tracks downstream ESB base commit/tag for patching.",
-            f"{key}={value}",
-            "",
-        ]
+    content = (
+        "# Auto-generated by branding generator. DO NOT EDIT.\n"
+        "# Tracks downstream ESB base commit/tag for patching.\n"
+        f"{key}={value}\n"
     )
     path.write_text(content, encoding="utf-8")
 
 
 def git_rev_parse(path: Path) -> str:
+    sha = _read_head_sha(path)
+    if sha:
+        return sha
+    import subprocess
+
     try:
         result = subprocess.run(
             ["git", "-C", str(path), "rev-parse", "HEAD"],
@@ -323,22 +340,52 @@ def git_rev_parse(path: Path) -> str:
     return result.stdout.strip()
 
 
+def _read_head_sha(path: Path) -> str | None:
+    # Resolve HEAD from the .git directory without spawning git; None means
+    # the layout is unusual (worktree, bare repo, subdirectory) and the caller
+    # should fall back to `git rev-parse`.
+    git_dir = path / ".git"
+    try:
+        head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    if _GIT_SHA_RE.fullmatch(head):
+        return head
+    if not head.startswith("ref: "):
+        return None
+    ref = head[len("ref: ") :].strip()
+    try:
+        sha = (git_dir / ref).read_text(encoding="utf-8").strip()
+    except OSError:
+        sha = _read_packed_ref(git_dir, ref)
+    if sha and _GIT_SHA_RE.fullmatch(sha):
+        return sha
+    return None
+
+
+def _read_packed_ref(git_dir: Path, ref: str) -> str | None:
+    try:
+        packed = (git_dir / "packed-refs").read_text(encoding="utf-8")
+    except OSError:
+        return None
+    for line in packed.splitlines():
+        if not line or line.startswith(("#", "^")):
+            continue
+        sha, _, name = line.partition(" ")
+        if name == ref:
+            return sha
+    return None
+
+
 def load_brand_from_config(path: Path) -> str | None:
     if not path.exists():
         return None
-    raw = path.read_text(encoding="utf-8").splitlines()
-    for line in raw:
-        stripped = line.strip()
-        if not stripped or stripped.startswith("#"):
-            continue
-        if not stripped.startswith("brand:"):
-            continue
-        value = stripped.split(":", 1)[1].strip()
-        value = _strip_inline_comment(value)
+    match = _BRAND_LINE_RE.search(path.read_text(encoding="utf-8"))
+    if match:
+        value = _strip_inline_comment(match.group(1).strip())
         value = _strip_quotes(value)
         if value:
             return value
-        break
     raise BrandingError("config/branding.yaml missing 'brand' value")
 
 
@@ -364,15 +411,12 @@ def _strip_quotes(value: str) -> str:
 
 def write_brand_config(path: Path, brand: str) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    content = "\n".join(
-        [
-            "# Where: config/branding.yaml",
-            "# What: Branding identifier for generator defaults.",
-            "# Why: Keep branding reproducible across clones.",
-            f"brand: {brand}",
-        ]
+    content = (
+        "# Where: config/branding.yaml\n"
+        "# What: Branding identifier for generator defaults.\n"
+        "# Why: Keep branding reproducible across clones.\n"
+        f"brand: {brand}\n"
     )
-    content += "\n"
     path.write_text(content, encoding="utf-8")
 
 
@@ -384,61 +428,158 @@ def render_templates(
     *,
     strip_header: bool = False,
 ) -> list[str]:
+    render_one = functools.partial(
+        _render_one,
+        root=root,
+        context=context,
+        ctx_key=frozenset(context.items()),
+        check=check,
+        verbose=verbose,
+        # Resolve the header policy once instead of re-testing it per template.
+        transform=remove_header if strip_header else None,
+    )
+    # Templates are independent and I/O bound; render them concurrently and
+    # report in TEMPLATES order so output stays deterministic.
+    with ThreadPoolExecutor(max_workers=len(TEMPLATES)) as executor:
+        results = list(executor.map(render_one, TEMPLATES))
+
     mismatches: list[str] = []
-    for spec in TEMPLATES:
-        template_path = TEMPLATE_ROOT / spec.template
-        target_path = root / render_string(spec.target, context)
-        template = template_path.read_text(encoding="utf-8")
-        rendered = render_string(template, context)
-        if strip_header:
-            rendered = remove_header(rendered, template_path)
+    for mismatch, message in results:
+        if message is not None:
+            print(message)
+        if mismatch is not None:
+            mismatches.append(mismatch)
+    return mismatches
 
-        if check:
-            if not target_path.exists():
-                mismatches.append(str(target_path))
-                continue
-            existing = target_path.read_text(encoding="utf-8")
-            if existing != rendered:
-                mismatches.append(str(target_path))
-                print(f"Diff for {target_path}:")
-                diff = difflib.unified_diff(
-                    existing.splitlines(keepends=True),
-                    rendered.splitlines(keepends=True),
-                    fromfile="current",
-                    tofile="generated",
-                )
-                print("".join(diff))
-            continue
 
-        if verbose:
-            print(f"render {template_path} -> {target_path}")
-        write_file(target_path, rendered)
-    return mismatches
+def _render_one(
+    spec: TemplateSpec,
+    *,
+    root: Path,
+    context: dict[str, str],
+    ctx_key: frozenset[tuple[str, str]],
+    check: bool,
+    verbose: bool,
+    transform: Callable[[str, Path], str] | None,
+) -> tuple[str | None, str | None]:
+    # Returns (mismatched target path, message to print) for one template.
+    template_path = TEMPLATE_ROOT / spec.template
+    target_path = root / render_string(spec.target, context)
+    st = template_path.stat()
+    cache_key = (template_path, st.st_mtime_ns, st.st_size, ctx_key, transform)
+    rendered_bytes = _RENDER_CACHE.get(cache_key)
+    if rendered_bytes is None:
+        format_key = (template_path, st.st_mtime_ns, st.st_size)
+        format_template = _FORMAT_CACHE.get(format_key)
+        if format_template is None:
+            template = template_path.read_bytes().decode("utf-8")
+            format_template = _to_format_template(template)
+            _FORMAT_CACHE[format_key] = format_template
+        rendered = _render_format_template(format_template, context)
+        if transform is not None:
+            rendered = transform(rendered, template_path)
+        rendered_bytes = rendered.encode("utf-8")
+        _RENDER_CACHE[cache_key] = rendered_bytes
+
+    if check:
+        try:
+            target_stat = target_path.stat()
+        except FileNotFoundError:
+            return str(target_path), None
+        # Cheap size test first; only equal-length files need a byte compare.
+        existing = None
+        if target_stat.st_size == len(rendered_bytes):
+            existing = target_path.read_bytes()
+            if existing == rendered_bytes:
+                return None, None
+        if not verbose:
+            return str(target_path), None
+        import difflib
+
+        if existing is None:
+            existing = target_path.read_bytes()
+        diff = difflib.unified_diff(
+            existing.decode("utf-8").splitlines(keepends=True),
+            rendered_bytes.decode("utf-8").splitlines(keepends=True),
+            fromfile="current",
+            tofile="generated",
+        )
+        return str(target_path), f"Diff for {target_path}:\n" + "".join(diff)
+
+    write_file(target_path, rendered_bytes)
+    if verbose:
+        return None, f"render {template_path} -> {target_path}"
+    return None, None
+
+
+def _to_format_template(template: str) -> str:
+    # Rewrite {{KEY}} to {KEY} and escape every other brace for str.format_map.
+    parts: list[str] = []
+    last = 0
+    for match in _PLACEHOLDER_RE.finditer(template):
+        literal = template[last : match.start()]
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        parts.append("{" + match.group(1) + "}")
+        last = match.end()
+    parts.append(template[last:].replace("{", "{{").replace("}", "}}"))
+    return "".join(parts)
+
+
+def _render_format_template(format_template: str, context: dict[str, str]) -> str:
+    try:
+        rendered = format_template.format_map(context)
+    except (KeyError, ValueError) as exc:
+        # ValueError covers digit-only keys, which format_map treats as
+        # positional fields; report them like any other unknown key.
+        for _, field_name, _, _ in string.Formatter().parse(format_template):
+            if field_name is not None and field_name not in context:
+                raise BrandingError(f"unknown template key: {field_name}") from exc
+        raise BrandingError(f"invalid template: {exc}") from exc
+    if "{{" in rendered:
+        raise BrandingError("unresolved template placeholders detected")
+    return rendered
 
 
 def render_string(template: str, context: dict[str, str]) -> str:
-    def replace(match: re.Match[str]) -> str:
-        key = match.group(1)
-        if key not in context:
-            raise BrandingError(f"unknown template key: {key}")
-        return context[key]
-
-    rendered = _PLACEHOLDER_RE.sub(replace, template)
-    if _PLACEHOLDER_RE.search(rendered):
+    if context:
+        keys = tuple(context)
+        compiled = _build_render_engine(keys)
+        values = tuple(context[key] for key in keys)
+        rendered = compiled.sub(lambda match: values[match.lastindex - 1], template)
+    else:
+        rendered = template
+    if "{{" in rendered:
+        match = _PLACEHOLDER_RE.search(rendered)
+        if match:
+            raise BrandingError(f"unknown template key: {match.group(1)}")
         raise BrandingError("unresolved template placeholders detected")
     return rendered
 
 
-def write_file(path: Path, content: str) -> None:
+@functools.lru_cache(maxsize=16)
+def _build_render_engine(keys: tuple[str, ...]) -> re.Pattern[str]:
+    # One capture group per key, so match.lastindex - 1 indexes the value tuple.
+    alternation = "|".join(f"({re.escape(key)})" for key in keys)
+    return re.compile(r"\{\{\s*(?:" + alternation + r")\s*\}\}")
+
+
+def write_file(path: Path, content: str | bytes) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    mode = None
-    if path.exists():
-        mode = path.stat().st_mode & 0o777
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    # Default for generated files. Executable if .sh.
+    mode = 0o755 if path.suffix == ".sh" else 0o644
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+    except FileExistsError:
+        # Truncating in place keeps the existing file mode. O_CREAT covers a
+        # dangling symlink, which O_EXCL reports as existing.
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
     else:
-        # Default for generated files. Executable if .sh.
-        mode = 0o755 if path.suffix == ".sh" else 0o644
-    path.write_text(content, encoding="utf-8")
-    os.chmod(path, mode)
+        # Re-apply on the fd so the result does not depend on the umask.
+        os.fchmod(fd, mode)
+    with os.fdopen(fd, "wb") as handle:
+        handle.write(content)
 
 
 def remove_header(content: str, template_path: Path) -> str:
@@ -464,36 +605,31 @@ def _strip_json_comment(content: str) -> str:
 
 
 def _strip_comment_header(content: str) -> str:
-    lines = content.splitlines()
-    idx = 0
-    prefix: list[str] = []
-    if lines and lines[0].startswith("#!"):
-        prefix.append(lines[0])
-        idx = 1
-    while idx < len(lines):
-        line = lines[idx]
-        stripped = line.strip()
-        if not stripped:
-            idx += 1
-            continue
-        if stripped.startswith("#") or stripped.startswith("//"):
-            idx += 1
-            continue
-        break
-    remainder = lines[idx:]
-    trimmed = list(remainder)
-    while trimmed and not trimmed[0].strip():
-        trimmed.pop(0)
-    if prefix:
-        result_lines = (
-            prefix + ([""] if trimmed and trimmed[0].strip() else []) + trimmed
-        )
-    else:
-        result_lines = trimmed
-    result_text = "\n".join(result_lines)
-    if content.endswith("\n"):
-        result_text += "\n"
-    return result_text
+    # Scan line offsets in place; only the header is visited, never the body.
+    shebang = None
+    cursor = 0
+    if content.startswith("#!"):
+        end = content.find("\n")
+        if end == -1:
+            return content
+        shebang = content[:end]
+        cursor = end + 1
+    length = len(content)
+    while cursor < length:
+        end = content.find("\n", cursor)
+        if end == -1:
+            end = length
+        stripped = content[cursor:end].lstrip()
+        if stripped and not stripped.startswith(("#", "//")):
+            break
+        cursor = end + 1
+    body = content[cursor:]
+    trailing = "\n" if content.endswith("\n") else ""
+    if shebang is None:
+        return body or trailing
+    if body:
+        return f"{shebang}\n\n{body}"
+    return shebang + trailing
 
 
 if __name__ == "__main__":
@@ -9,9 +9,17 @@ import pytest
 
 from tools.branding.branding import BrandingError, build_context, derive_branding
 from tools.branding.generate import (
+    TEMPLATES,
+    _render_format_template,
+    _to_format_template,
+    git_rev_parse,
     load_brand_from_config,
+    load_lock_data,
+    remove_header,
     render_string,
+    render_templates,
     resolve_brand,
+    write_file,
 )
 
 
@@ -23,11 +31,38 @@ def test_load_branding_builds_context() -> None:
     assert context["RUNTIME_CNI_BRIDGE"] == "esb0"
 
 
+def test_derive_branding_normalizes_separators() -> None:
+    branding = derive_branding("  --Acme  Corp!_v2-- ")
+    assert branding.slug == "acme-corp-v2"
+    assert branding.env_prefix == "ACME_CORP_V2"
+
+
+def test_derive_branding_rejects_non_string_input() -> None:
+    with pytest.raises(BrandingError):
+        derive_branding(["x"])  # type: ignore[arg-type]
+
+
+def test_derive_branding_is_memoized_and_read_only() -> None:
+    branding = derive_branding("esb")
+    assert derive_branding("esb") is branding
+    with pytest.raises(TypeError):
+        branding.paths["home_dir"] = ".other"  # type: ignore[index]
+    context = build_context(branding)
+    context["CLI_NAME"] = "changed"
+    assert build_context(branding)["CLI_NAME"] == "esb"
+
+
 def test_render_string_replaces_placeholders() -> None:
     rendered = render_string("run {{CLI_NAME}}", {"CLI_NAME": "esb"})
     assert rendered == "run esb"
 
 
+def test_render_string_handles_keys_sharing_a_prefix() -> None:
+    context = {"ENV_PREFIX": "ESB", "ENV_PREFIX_VAR": "${ESB"}
+    rendered = render_string("{{ENV_PREFIX_VAR}}_X} {{ ENV_PREFIX }}", context)
+    assert rendered == "${ESB_X} ESB"
+
+
 def test_render_string_rejects_unknown_keys() -> None:
     with pytest.raises(BrandingError):
         render_string("{{MISSING}}", {})
@@ -58,12 +93,116 @@ def test_compose_templates_include_proxy_ca_secret_wiring() -> None:
         assert expected_secret_line in rendered
 
 
+def test_render_templates_check_passes_after_render(tmp_path) -> None:
+    context = build_context(derive_branding("acme"))
+    assert render_templates(tmp_path, context, False, False) == []
+    assert render_templates(tmp_path, context, True, False) == []
+    assert "acme" in (tmp_path / "docker-bake.hcl").read_text(encoding="utf-8")
+
+
+def test_render_templates_matches_render_string(tmp_path) -> None:
+    context = build_context(derive_branding("acme"))
+    render_templates(tmp_path, context, False, False)
+    for spec in TEMPLATES:
+        template = Path(spec.template).read_text(encoding="utf-8")
+        rendered = (tmp_path / spec.target).read_text(encoding="utf-8")
+        assert rendered == render_string(template, context)
+
+
+def test_format_templates_report_unknown_keys() -> None:
+    for key in ("0", "MISSING"):
+        format_template = _to_format_template("a {{ %s }} b {{CLI_NAME}}" % key)
+        with pytest.raises(BrandingError, match=f"unknown template key: {key}"):
+            _render_format_template(format_template, {"CLI_NAME": "esb"})
+
+
+def test_render_templates_check_reports_stale_outputs(tmp_path) -> None:
+    context = build_context(derive_branding("acme"))
+    render_templates(tmp_path, context, False, False)
+    (tmp_path / ".mise.toml").write_text("stale\n", encoding="utf-8")
+    (tmp_path / "docker-bake.hcl").unlink()
+    mismatches = render_templates(tmp_path, context, True, False)
+    assert mismatches == [
+        str(tmp_path / "docker-bake.hcl"),
+        str(tmp_path / ".mise.toml"),
+    ]
+
+
+def test_remove_header_strips_leading_comments_and_keeps_shebang() -> None:
+    content = "#!/bin/sh\n# Where: x\n// What: y\n\nset -e\n# body comment\n"
+    assert remove_header(content, Path("run.sh.tmpl")) == "#!/bin/sh\n\nset -e\n# body comment\n"
+    assert remove_header("# only\n\n", Path("a.yml.tmpl")) == "\n"
+
+
+def test_write_file_keeps_mode_and_follows_dangling_symlink(tmp_path) -> None:
+    existing = tmp_path / "existing.sh"
+    existing.write_text("old\n", encoding="utf-8")
+    existing.chmod(0o600)
+    write_file(existing, "new\n")
+    assert existing.read_text(encoding="utf-8") == "new\n"
+    assert existing.stat().st_mode & 0o777 == 0o600
+
+    link = tmp_path / "link.yml"
+    link.symlink_to(tmp_path / "target.yml")
+    write_file(link, b"data\n")
+    assert (tmp_path / "target.yml").read_bytes() == b"data\n"
+
+
+def test_load_lock_data_flattens_nested_keys(tmp_path) -> None:
+    path = tmp_path / "branding.lock"
+    path.write_text(
+        "# header\n"
+        "schema_version: 1\n"
+        "\n"
+        "tool:\n"
+        '  commit: "abc123"  # pinned\n'
+        "source:\n"
+        "  esb_repo: 'https://example.com/esb.git'\n"
+        '  esb_ref: "https://x/a #frag" # quoted\n'
+        "parameters:\n"
+        "  brand: esb\n",
+        encoding="utf-8",
+    )
+    assert load_lock_data(path) == {
+        "schema_version": "1",
+        "tool.commit": "abc123",
+        "source.esb_repo": "https://example.com/esb.git",
+        "source.esb_ref": "https://x/a #frag",
+        "parameters.brand": "esb",
+    }
+
+
+def test_git_rev_parse_reads_head_without_git(tmp_path) -> None:
+    sha = "0123456789abcdef0123456789abcdef01234567"
+    git_dir = tmp_path / ".git"
+    git_dir.mkdir()
+    (git_dir / "HEAD").write_text("ref: refs/heads/main\n", encoding="utf-8")
+    (git_dir / "packed-refs").write_text(
+        f"# pack-refs with: peeled\n{sha} refs/heads/main\n", encoding="utf-8"
+    )
+    assert git_rev_parse(tmp_path) == sha
+    (git_dir / "refs" / "heads").mkdir(parents=True)
+    (git_dir / "refs" / "heads" / "main").write_text(sha[::-1] + "\n", encoding="utf-8")
+    assert git_rev_parse(tmp_path) == sha[::-1]
+    (git_dir / "HEAD").write_text(sha + "\n", encoding="utf-8")
+    assert git_rev_parse(tmp_path) == sha
+
+
 def test_load_brand_from_config_reads_brand(tmp_path) -> None:
     path = tmp_path / "branding.yaml"
     path.write_text("# comment\nbrand: acme # trailing\n", encoding="utf-8")
     assert load_brand_from_config(path) == "acme"
 
 
+def test_load_brand_from_config_strips_quotes_and_rejects_empty(tmp_path) -> None:
+    path = tmp_path / "branding.yaml"
+    path.write_text('other: x\nbrand: "acme" # quoted\n', encoding="utf-8")
+    assert load_brand_from_config(path) == "acme"
+    path.write_text("brand:\nother: acme\n", encoding="utf-8")
+    with pytest.raises(BrandingError):
+        load_brand_from_config(path)
+
+
 def test_resolve_brand_prefers_config(tmp_path) -> None:
     config_dir = tmp_path / "config"
     config_dir.mkdir()
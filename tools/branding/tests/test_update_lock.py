@@ -0,0 +1,172 @@
+# Where: tools/branding/tests/test_update_lock.py
+# What: Tests for branding.lock update helpers.
+# Why: Keep lock metadata resolution and rendering stable.
+from __future__ import annotations
+
+import os
+import subprocess
+
+from tools.branding.generate import load_lock_data
+from tools.branding.update_lock import (
+    _equivalent_lock,
+    _git_head,
+    _inputs_digest,
+    _lock_digest_matches,
+    _normalize_ref,
+    _read_lock,
+    _render_lock,
+    _write_lock_digest,
+)
+
+
+_GIT_ENV = {
+    **os.environ,
+    "GIT_AUTHOR_NAME": "test",
+    "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "test",
+    "GIT_COMMITTER_EMAIL": "test@example.com",
+}
+
+
+def _run_git(path, *args: str) -> None:
+    subprocess.run(["git", "-C", str(path), *args], check=True, env=_GIT_ENV)
+
+
+def test_git_head_returns_commit_and_exact_tag(tmp_path) -> None:
+    _run_git(tmp_path, "init", "-q")
+    _run_git(tmp_path, "commit", "-q", "--allow-empty", "-m", "init")
+    commit, ref = _git_head(tmp_path)
+    assert len(commit) == 40
+    assert ref is None
+    _run_git(tmp_path, "tag", "v1.2.3")
+    assert _git_head(tmp_path) == (commit, "v1.2.3")
+
+
+def test_git_head_prefers_annotated_tags(tmp_path) -> None:
+    _run_git(tmp_path, "init", "-q")
+    _run_git(tmp_path, "commit", "-q", "--allow-empty", "-m", "init")
+    commit, _ = _git_head(tmp_path)
+    _run_git(tmp_path, "tag", "-a", "a-annot", "-m", "annotated")
+    _run_git(tmp_path, "tag", "z-light")
+    assert _git_head(tmp_path) == (commit, "a-annot")
+
+
+def test_git_head_keeps_tags_that_look_like_describe_output(tmp_path) -> None:
+    _run_git(tmp_path, "init", "-q")
+    _run_git(tmp_path, "commit", "-q", "--allow-empty", "-m", "init")
+    commit, _ = _git_head(tmp_path)
+    _run_git(tmp_path, "tag", "rel-0-gabc")
+    assert _git_head(tmp_path) == (commit, "rel-0-gabc")
+
+
+def test_lock_digest_detects_input_and_content_changes(tmp_path) -> None:
+    lock_path = tmp_path / "branding.lock"
+    digest_path = tmp_path / "branding.lock.sha256"
+    lock_path.write_text('parameters:\n  brand: "esb"\n', encoding="utf-8")
+    digest = _inputs_digest("esb", None)
+    assert not _lock_digest_matches(lock_path, digest_path, digest)
+
+    _write_lock_digest(digest_path, digest, lock_path.read_bytes())
+    assert _lock_digest_matches(lock_path, digest_path, digest)
+    assert not _lock_digest_matches(
+        lock_path, digest_path, _inputs_digest("acme", None)
+    )
+
+    mtime = digest_path.stat().st_mtime_ns
+    os.utime(digest_path, ns=(mtime - 10**9, mtime - 10**9))
+    _write_lock_digest(digest_path, digest, lock_path.read_bytes())
+    assert digest_path.stat().st_mtime_ns == mtime - 10**9
+
+    lock_path.write_text('parameters:\n  brand: "edited"\n', encoding="utf-8")
+    assert not _lock_digest_matches(lock_path, digest_path, digest)
+
+
+def test_read_lock_round_trips_rendered_lock(tmp_path) -> None:
+    path = tmp_path / "branding.lock"
+    path.write_text(
+        _render_lock(
+            schema_version=1,
+            locked_at="2026-01-01T00:00:00Z",
+            tool_commit="abc",
+            tool_ref="v1.0.0",
+            esb_repo="https://github.com/poruru-code/esb.git",
+            esb_commit="def",
+            esb_ref=None,
+            brand="esb",
+        ),
+        encoding="utf-8",
+    )
+    assert _read_lock(path) == {
+        "schema_version": "1",
+        "locked_at": "2026-01-01T00:00:00Z",
+        "tool.commit": "abc",
+        "tool.ref": "v1.0.0",
+        "source.esb_repo": "https://github.com/poruru-code/esb.git",
+        "source.esb_commit": "def",
+        "parameters.brand": "esb",
+    }
+
+
+def test_read_lock_ignores_trailing_comments(tmp_path) -> None:
+    path = tmp_path / "branding.lock"
+    path.write_text(
+        "schema_version: 1  # bump on format change\n"
+        "tool:\n"
+        '  commit: "abc#1" # pinned\n'
+        "  ref: v1 # tag\n",
+        encoding="utf-8",
+    )
+    assert _read_lock(path) == {
+        "schema_version": "1",
+        "tool.commit": "abc#1",
+        "tool.ref": "v1",
+    }
+
+
+def test_equivalent_lock_compares_each_field() -> None:
+    existing = {
+        "schema_version": "1",
+        "tool.commit": "abc",
+        "source.esb_repo": "https://github.com/poruru-code/esb.git",
+        "source.esb_commit": "def",
+        "parameters.brand": "esb",
+    }
+    fields = {
+        "tool_commit": "abc",
+        "tool_ref": None,
+        "esb_repo": "https://github.com/poruru-code/esb.git",
+        "esb_commit": "def",
+        "esb_ref": None,
+        "brand": "esb",
+    }
+    assert _equivalent_lock(existing, **fields)
+    assert not _equivalent_lock(existing, **{**fields, "esb_commit": "123"})
+    assert not _equivalent_lock(existing, **{**fields, "tool_ref": "v1.0.0"})
+
+
+def test_normalize_ref_drops_commit_shas() -> None:
+    assert _normalize_ref(None) is None
+    assert _normalize_ref("5694369") is None
+    assert _normalize_ref(" 5694369811f4b06451813688e66e35293b50a7e2 ") is None
+    assert _normalize_ref("v1.2.3") == "v1.2.3"
+    assert _normalize_ref("main") == "main"
+    assert _normalize_ref("release2026") == "release2026"
+
+
+def test_lock_readers_agree_on_comments(tmp_path) -> None:
+    path = tmp_path / "branding.lock"
+    path.write_text(
+        "schema_version: 1#inline\n"
+        "tool:\n"
+        '  commit: "abc #1" # pinned\n'
+        "  ref: v1 # tag\n",
+        encoding="utf-8",
+    )
+    assert _read_lock(path) == load_lock_data(path)
+
+
+def test_write_lock_digest_ignores_unwritable_sidecar(tmp_path) -> None:
+    digest_path = tmp_path / "branding.lock.sha256"
+    digest_path.mkdir()
+    _write_lock_digest(digest_path, "digest", b"content")
+    assert digest_path.is_dir()
@@ -4,13 +4,24 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import os
 import re
+import shutil
 import subprocess
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 LOCK_SCHEMA_VERSION = 1
+TOOL_ROOT = Path(__file__).resolve().parents[2]
+
+# Absolute path lets subprocess use posix_spawn instead of fork/exec.
+_GIT_BIN = shutil.which("git") or "git"
+
+_SHA_RE = re.compile(r"[0-9a-fA-F]{7,40}")
+
+# Never block on credential prompts; set once so git inherits our environment.
+os.environ.setdefault("GIT_TERMINAL_PROMPT", "0")
 
 
 class LockError(RuntimeError):
@@ -19,33 +30,52 @@ class LockError(RuntimeError):
 
 def main() -> int:
     args = parse_args()
-    tool_root = Path(__file__).resolve().parents[2]
+    tool_root = TOOL_ROOT
     esb_dir = args.esb_dir.resolve()
 
-    esb_repo = args.esb_repo or _read_git_remote(esb_dir)
+    # The git lookups are independent; overlap their spawn and I/O latency.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        remote_future = None
+        if not args.esb_repo:
+            remote_future = executor.submit(_read_git_remote, esb_dir)
+        tool_future = executor.submit(_git_head, tool_root)
+        esb_future = executor.submit(_git_rev_parse, esb_dir)
+
+    esb_repo = args.esb_repo or remote_future.result()
     if not esb_repo:
         raise LockError("esb_repo is required (pass --esb-repo)")
     if "://" not in esb_repo and "/" in esb_repo:
         esb_repo = f"https://github.com/{esb_repo}.git"
 
-    tool_commit = _git_rev_parse(tool_root)
-    tool_ref = _git_exact_ref(tool_root)
-    esb_commit = _git_rev_parse(esb_dir)
+    tool_commit, tool_ref = tool_future.result()
+    esb_commit = esb_future.result()
 
     esb_ref = _normalize_ref(args.esb_ref)
-    new_data = {
-        "schema_version": str(LOCK_SCHEMA_VERSION),
-        "tool.commit": tool_commit,
-        "tool.ref": tool_ref,
-        "source.esb_repo": esb_repo,
-        "source.esb_commit": esb_commit,
-        "source.esb_ref": esb_ref,
-        "parameters.brand": args.brand,
-    }
 
     lock_path = tool_root / args.lock_file
+    digest_path = lock_path.with_name(lock_path.name + ".sha256")
+    inputs_digest = _inputs_digest(
+        str(LOCK_SCHEMA_VERSION),
+        tool_commit,
+        tool_ref,
+        esb_repo,
+        esb_commit,
+        esb_ref,
+        args.brand,
+    )
+    if _lock_digest_matches(lock_path, digest_path, inputs_digest):
+        return 0
     existing = _read_lock(lock_path)
-    if existing and _equivalent_lock(existing, new_data):
+    if existing and _equivalent_lock(
+        existing,
+        tool_commit=tool_commit,
+        tool_ref=tool_ref,
+        esb_repo=esb_repo,
+        esb_commit=esb_commit,
+        esb_ref=esb_ref,
+        brand=args.brand,
+    ):
+        _write_lock_digest(digest_path, inputs_digest, lock_path.read_bytes())
         return 0
 
     locked_at = _now_iso()
@@ -59,7 +89,16 @@ def main() -> int:
         esb_ref=esb_ref,
         brand=args.brand,
     )
-    lock_path.write_text(content, encoding="utf-8")
+    lock_bytes = content.encode("utf-8")
+    # Write next to the lock and rename over it so readers never see a
+    # partially written file.
+    tmp_path = lock_path.with_name(lock_path.name + ".tmp")
+    try:
+        tmp_path.write_bytes(lock_bytes)
+        os.replace(tmp_path, lock_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    _write_lock_digest(digest_path, inputs_digest, lock_bytes)
     return 0
 
 
@@ -74,18 +113,27 @@ def parse_args() -> argparse.Namespace:
 
 
 def _now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+    from datetime import datetime, timezone
+
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
 def _git_rev_parse(path: Path) -> str:
     return _git(path, ["rev-parse", "HEAD"])
 
 
-def _git_exact_ref(path: Path) -> str | None:
+def _git_head(path: Path) -> tuple[str, str | None]:
+    # With --long, an exact match prints "<tag>-0-g<full sha>" (--abbrev is
+    # clamped to the hash length), so one spawn yields the same tag as plain
+    # describe plus the commit. Only an untagged HEAD needs rev-parse.
     try:
-        return _git(path, ["describe", "--tags", "--exact-match"])
+        described = _git(
+            path, ["describe", "--tags", "--exact-match", "--long", "--abbrev=64"]
+        )
     except LockError:
-        return None
+        return _git_rev_parse(path), None
+    tag, _, commit = described.rpartition("-0-g")
+    return commit, tag
 
 
 def _read_git_remote(path: Path) -> str | None:
@@ -96,84 +144,121 @@ def _read_git_remote(path: Path) -> str | None:
 
 
 def _git(path: Path, args: list[str]) -> str:
-    env = os.environ.copy()
-    env.setdefault("GIT_TERMINAL_PROMPT", "0")
     try:
         result = subprocess.run(
-            ["git", "-C", str(path), *args],
+            [_GIT_BIN, "-C", str(path), *args],
             check=True,
             capture_output=True,
-            text=True,
-            env=env,
+            # Our fds are non-inheritable (PEP 446); keeping close_fds off is
+            # what allows CPython to take the posix_spawn fast path.
+            close_fds=False,
         )
     except subprocess.CalledProcessError as exc:
-        stderr = exc.stderr.strip() if exc.stderr else ""
+        stderr = exc.stderr.decode("utf-8", "replace").strip() if exc.stderr else ""
         raise LockError(f"git failed ({' '.join(args)}): {stderr}") from exc
-    return result.stdout.strip()
+    # Decode once from bytes instead of going through a text-mode pipe.
+    return result.stdout.decode("utf-8").strip()
 
 
 def _read_lock(path: Path) -> dict[str, str] | None:
     if not path.exists():
         return None
+    # branding.lock is at most one level deep (see _render_lock), so a single
+    # current-section name replaces a generic indent stack.
     data: dict[str, str] = {}
-    stack: list[dict[str, str]] = []
-    prefixes: list[str] = []
+    section = ""
     for line in path.read_text(encoding="utf-8").splitlines():
-        stripped = line.strip()
-        if not stripped or stripped.startswith("#"):
-            continue
-        indent = len(line) - len(line.lstrip(" "))
-        while stack and indent < len(stack) * 2:
-            stack.pop()
-            prefixes.pop()
-        if ":" not in stripped:
-            continue
-        key, raw_value = stripped.split(":", 1)
+        key, sep, value = line.partition(":")
         key = key.strip()
-        raw_value = raw_value.strip()
-        if not raw_value:
-            if stack:
-                prefixes.append(f"{prefixes[-1]}{key}.")
-            else:
-                prefixes.append(f"{key}.")
-            stack.append({})
+        if not sep or not key or key.startswith("#"):
             continue
-        value = _strip_quotes(raw_value)
-        prefix = prefixes[-1] if prefixes else ""
-        data[f"{prefix}{key}"] = value
+        value = _strip_inline_comment(value.strip())
+        nested = line.startswith(" ")
+        if not value:
+            if not nested:
+                section = f"{key}."
+            continue
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+            value = value[1:-1]
+        data[section + key if nested else key] = value
     return data
 
 
-def _strip_quotes(value: str) -> str:
-    if len(value) >= 2 and value[0] == value[-1] and value[0] in {'"', "'"}:
-        return value[1:-1]
-    return value
+def _inputs_digest(*values: str | None) -> str:
+    payload = "\0".join(value or "" for value in values)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _lock_digest_matches(lock_path: Path, digest_path: Path, inputs_digest: str) -> bool:
+    # The sidecar records the inputs digest and the lock's content hash, so a
+    # hand-edited lock never matches and falls through to the full parse.
+    try:
+        recorded = digest_path.read_text(encoding="utf-8").split()
+        lock_bytes = lock_path.read_bytes()
+    except OSError:
+        return False
+    return recorded == [inputs_digest, hashlib.sha256(lock_bytes).hexdigest()]
+
+
+def _write_lock_digest(digest_path: Path, inputs_digest: str, lock_bytes: bytes) -> None:
+    lock_digest = hashlib.sha256(lock_bytes).hexdigest()
+    content = f"{inputs_digest} {lock_digest}\n"
+    # The sidecar is only a cache: never let reading or writing it fail a run.
+    try:
+        if digest_path.read_text(encoding="utf-8") == content:
+            return
+    except OSError:
+        pass
+    try:
+        digest_path.write_text(content, encoding="utf-8")
+    except OSError:
+        pass
+
+
+def _strip_inline_comment(value: str) -> str:
+    # Same rules as generate._strip_inline_comment so both readers of
+    # branding.lock agree on every line.
+    if not value:
+        return value
+    if value.startswith(("'", '"')):
+        quote = value[0]
+        end = value.find(quote, 1)
+        if end != -1:
+            return value[: end + 1]
+        return value
+    return value.split("#", 1)[0].strip()
 
 
 def _normalize_ref(value: str | None) -> str | None:
     if not value:
         return None
     value = value.strip()
-    if re.fullmatch(r"[0-9a-fA-F]{7,40}", value):
+    # Cheap length/charset prefilter: refs like "v1.2.3" never reach the regex.
+    if 7 <= len(value) <= 40 and value.isalnum() and _SHA_RE.fullmatch(value):
         return None
     return value
 
 
-def _equivalent_lock(existing: dict[str, str], new_data: dict[str, str]) -> bool:
-    keys = [
-        "schema_version",
-        "tool.commit",
-        "tool.ref",
-        "source.esb_repo",
-        "source.esb_commit",
-        "source.esb_ref",
-        "parameters.brand",
-    ]
-    for key in keys:
-        existing_value = existing.get(key) or None
-        if existing_value != (new_data.get(key) or None):
-            return False
-    return True
+def _equivalent_lock(
+    existing: dict[str, str],
+    *,
+    tool_commit: str,
+    tool_ref: str | None,
+    esb_repo: str,
+    esb_commit: str,
+    esb_ref: str | None,
+    brand: str,
+) -> bool:
+    # Most likely to change first (a new ESB commit), so mismatches short-circuit.
+    return (
+        existing.get("source.esb_commit") == esb_commit
+        and existing.get("tool.commit") == tool_commit
+        and existing.get("schema_version") == str(LOCK_SCHEMA_VERSION)
+        and (existing.get("tool.ref") or None) == (tool_ref or None)
+        and existing.get("source.esb_repo") == esb_repo
+        and (existing.get("source.esb_ref") or None) == (esb_ref or None)
+        and (existing.get("parameters.brand") or None) == (brand or None)
+    )
 
 
 def _render_lock(
@@ -187,34 +272,22 @@ def _render_lock(
     esb_ref: str | None,
     brand: str,
 ) -> str:
-    lines = [
-        f"schema_version: {schema_version}",
-        f"locked_at: \"{locked_at}\"",
-        "",
-        "tool:",
-        f"  commit: \"{tool_commit}\"",
-    ]
-    if tool_ref:
-        lines.append(f"  ref: \"{tool_ref}\"")
-    lines.extend(
-        [
-            "",
-            "source:",
-            f"  esb_repo: \"{esb_repo}\"",
-            f"  esb_commit: \"{esb_commit}\"",
-        ]
-    )
-    if esb_ref:
-        lines.append(f"  esb_ref: \"{esb_ref}\"")
-    lines.extend(
-        [
-            "",
-            "parameters:",
-            f"  brand: \"{brand}\"",
-            "",
-        ]
+    tool_ref_line = f'\n  ref: "{tool_ref}"' if tool_ref else ""
+    esb_ref_line = f'\n  esb_ref: "{esb_ref}"' if esb_ref else ""
+    return (
+        f"schema_version: {schema_version}\n"
+        f'locked_at: "{locked_at}"\n'
+        "\n"
+        "tool:\n"
+        f'  commit: "{tool_commit}"{tool_ref_line}\n'
+        "\n"
+        "source:\n"
+        f'  esb_repo: "{esb_repo}"\n'
+        f'  esb_commit: "{esb_commit}"{esb_ref_line}\n'
+        "\n"
+        "parameters:\n"
+        f'  brand: "{brand}"\n'
     )
-    return "\n".join(lines)
 
 
 if __name__ == "__main__":